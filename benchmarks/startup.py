@@ -0,0 +1,78 @@
+"""
+Замер холодного старта: время импорта todo.app и задержка первого запроса.
+
+Каждый прогон выполняется в отдельном процессе, чтобы модули не были закэшированы,
+и во временной директории со своей пустой БД, чтобы не трогать рабочее дерево.
+Для TestClient нужен пакет httpx.
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json
+import time
+
+start = time.perf_counter()
+from todo.app import app
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+
+with TestClient(app) as client:
+    ready = time.perf_counter()
+    client.get('/openapi.json')
+    first_request = time.perf_counter()
+
+print(json.dumps({
+    'import': imported - start,
+    'lifespan': ready - imported,
+    'first_request': first_request - ready,
+}))
+"""
+
+
+def run_once() -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        env = {
+            **os.environ,
+            'PYTHONPATH': os.path.join(ROOT, 'src'),
+            'JWT_SECRET': os.environ.get('JWT_SECRET', 'benchmark'),
+            'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'database.sqlite3')}",
+        }
+        output = subprocess.run(
+            [sys.executable, '-c', PROBE],
+            cwd=workdir,
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    for metric in ('import', 'lifespan', 'first_request'):
+        values = [result[metric] * 1000 for result in results]
+        print(
+            f"{metric:>14}: median {statistics.median(values):8.1f} ms,"
+            f" min {min(values):8.1f} ms, max {max(values):8.1f} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 import uvicorn
-from todo.settings import settings
+from todo.settings import get_settings
 
 if __name__ == "__main__":
+    settings = get_settings()
     uvicorn.run(
         "todo.app:app",
         host=settings.server_host,
@@ -2,8 +2,10 @@ from fastapi import APIRouter
 
 from .auth import router as auth_router
 from .todo import router as todos_router
+from .metrics import router as metrics_router
 
 
 router = APIRouter()
 router.include_router(auth_router)
 router.include_router(todos_router)
+router.include_router(metrics_router)
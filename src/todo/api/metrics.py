@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+
+from ..services.ratelimit import (
+    ConcurrencyLimiter,
+    RateLimiter,
+    get_concurrency_limiter,
+    get_rate_limiter,
+)
+from ..services.writebehind import WriteBehindBuffer, get_write_behind
+
+
+router = APIRouter(
+    prefix='/metrics',
+    tags=['/metrics'],
+)
+
+
+@router.get('/')
+def get_metrics(
+    rate_limiter: RateLimiter = Depends(get_rate_limiter),
+    concurrency_limiter: ConcurrencyLimiter = Depends(get_concurrency_limiter),
+    write_behind: WriteBehindBuffer = Depends(get_write_behind),
+):
+    """
+    Состояние ограничителей нагрузки и буфера отложенной записи.
+    """
+    return {
+        'rate_limiter': rate_limiter.stats(),
+        'concurrency_limiter': concurrency_limiter.stats(),
+        'write_behind': write_behind.stats(),
+    }
@@ -1,8 +1,23 @@
+import inspect
 import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, params, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 
-from .services.logging import logger
+from .database import create_db_engine, create_session_maker, get_engine, get_session_maker
+from .services.logging import RedisCache, RequestLogger, get_cache, get_logger
+from .services.ratelimit import (
+    ConcurrencyLimiter,
+    RateLimiter,
+    get_client_key,
+    get_concurrency_limiter,
+    get_rate_limiter,
+)
+from .services.singleflight import SingleFlight, get_coalescer
+from .services.writebehind import WriteBehindBuffer, get_write_behind
+from .settings import get_settings
 from .api import router
 
 
@@ -15,17 +30,138 @@ tags_metadata = [
         'name': '/todos',
         'description': 'Операции с задачами'
     },
+    {
+        'name': '/metrics',
+        'description': 'Метрики сервиса'
+    },
 ]
 
+
+class Provider:
+    """
+    Сборка ресурсов приложения с учетом app.dependency_overrides.
+
+    Подмена может объявлять параметры Depends(...) на уже собранные ресурсы,
+    как обычная зависимость FastAPI.
+    """
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+        self.resolved = {}
+
+    def _override_kwargs(self, override) -> dict:
+        kwargs = {}
+        for name, param in inspect.signature(override).parameters.items():
+            if not isinstance(param.default, params.Depends):
+                continue
+            if param.default.dependency not in self.resolved:
+                raise TypeError(
+                    f"Override parameter {name!r} depends on a resource "
+                    f"that is not built yet: {param.default.dependency.__name__}"
+                )
+            kwargs[name] = self.resolved[param.default.dependency]
+        return kwargs
+
+    async def __call__(self, dependency, factory, *args, **kwargs):
+        override = self.app.dependency_overrides.get(dependency)
+        if override:
+            factory, args, kwargs = override, (), self._override_kwargs(override)
+        # Фабрики могут работать с диском, поэтому вне event loop
+        value = await run_in_threadpool(factory, *args, **kwargs)
+        self.resolved[dependency] = value
+        return value
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Импорт модуля ничего не создает. Здесь собираются только объекты:
+    # подключения к БД и Redis открываются при первом использовании
+    state = app.state
+    provide = Provider(app)
+    state.settings = settings = await provide(get_settings, get_settings)
+    state.engine = await provide(get_engine, create_db_engine, settings)
+    state.session_maker = await provide(get_session_maker, create_session_maker, state.engine)
+    state.cache = await provide(get_cache, RedisCache)
+    state.logger = await provide(get_logger, RequestLogger, state.cache)
+    state.rate_limiter = await provide(
+        get_rate_limiter, RateLimiter,
+        state.cache,
+        rate=settings.rate_limit_rate,
+        burst=settings.rate_limit_burst,
+    )
+    state.concurrency_limiter = await provide(
+        get_concurrency_limiter, ConcurrencyLimiter,
+        settings.max_concurrent_requests,
+    )
+    state.coalescer = await provide(
+        get_coalescer, SingleFlight,
+        state.cache,
+        stale_ttl=settings.cache_stale_ttl,
+        lock_timeout=settings.cache_lock_timeout,
+    )
+    # Журнал отложенной записи воспроизводится до первого запроса
+    state.write_behind = await provide(
+        get_write_behind, WriteBehindBuffer,
+        settings.write_behind_journal,
+        state.session_maker,
+        interval=settings.write_behind_interval,
+        enabled=settings.write_behind_enabled,
+    )
+
+    yield
+
+    await run_in_threadpool(state.write_behind.stop)
+    if get_engine not in app.dependency_overrides:
+        state.engine.dispose()
+
+
 app = FastAPI(
     title='ToDo Service',
     openapi_tags=tags_metadata,
+    lifespan=lifespan,
 )
 
+
+@app.middleware("http")
+async def admission_control_middleware(request: Request, call_next):
+    settings = request.app.state.settings
+    if not settings.rate_limit_enabled or request.url.path.startswith('/metrics'):
+        return await call_next(request)
+
+    # Сбрасываем нагрузку в event loop, до любого ожидания в пуле потоков
+    concurrency_limiter = get_concurrency_limiter(request)
+    if not concurrency_limiter.acquire():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={'detail': 'Server is overloaded'},
+            headers={'Retry-After': '1'},
+        )
+
+    try:
+        rate_limiter = get_rate_limiter(request)
+        client_key = get_client_key(request, settings)
+        if rate_limiter.uses_network:
+            # Обращение к Redis синхронное: не блокируем им event loop
+            allowed, retry_after = await run_in_threadpool(rate_limiter.acquire, client_key)
+        else:
+            allowed, retry_after = rate_limiter.acquire(client_key)
+
+        if not allowed:
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={'detail': 'Too many requests'},
+                headers={'Retry-After': str(retry_after)},
+            )
+
+        return await call_next(request)
+    finally:
+        concurrency_limiter.release()
+
 @app.middleware("http")
 async def log_requests_middleware(request: Request, call_next):
     start_time = datetime.now(timezone.utc)
     request_id = str(time.time_ns())
+    logger = get_logger(request)
 
     try:
         response = await call_next(request)
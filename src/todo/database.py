@@ -1,29 +1,42 @@
+from fastapi import Depends, Request
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
 
-from .settings import settings
+from .settings import Settings
 
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={
-        "check_same_thread": False,
-        "timeout": 30
-    },
-    pool_size=10,
-    max_overflow=20,
-    pool_pre_ping=True,
-)
+def create_db_engine(settings: Settings) -> Engine:
+    return create_engine(
+        settings.database_url,
+        connect_args={
+            "check_same_thread": False,
+            "timeout": 30
+        },
+        pool_size=10,
+        max_overflow=20,
+        pool_pre_ping=True,
+    )
 
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine,
-)
 
+def create_session_maker(engine: Engine) -> sessionmaker:
+    return sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=engine,
+    )
 
-def get_session() -> Session:
-    session = SessionLocal()
+
+def get_engine(request: Request) -> Engine:
+    return request.app.state.engine
+
+
+def get_session_maker(request: Request) -> sessionmaker:
+    return request.app.state.session_maker
+
+
+def get_session(session_maker: sessionmaker = Depends(get_session_maker)) -> Session:
+    session = session_maker()
     try:
         yield session
     except Exception:
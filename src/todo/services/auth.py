@@ -10,13 +10,16 @@ from sqlalchemy.orm import Session
 from .. import tables
 from ..database import get_session
 from ..models.auth import User, Token, UserCreate
-from ..settings import settings
+from ..settings import Settings, get_settings
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/auth/sign-in')
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    return AuthUserService.validate_token(token)
+def get_current_user(
+        token: str = Depends(oauth2_scheme),
+        settings: Settings = Depends(get_settings),
+) -> User:
+    return AuthUserService.validate_token(token, settings)
 
 
 class AuthUserService:
@@ -29,7 +32,7 @@ class AuthUserService:
         return bcrypt.hash(password)
 
     @classmethod
-    def validate_token(cls, token: str) -> User:
+    def validate_token(cls, token: str, settings: Settings) -> User:
         exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Could not validate credentials',
@@ -53,7 +56,7 @@ class AuthUserService:
         return user
 
     @classmethod
-    def create_token(cls, user: tables.User) -> Token:
+    def create_token(cls, user: tables.User, settings: Settings) -> Token:
         user_data = User.model_validate(user)
 
         now = datetime.now(timezone.utc)
@@ -71,8 +74,13 @@ class AuthUserService:
         )
         return Token(access_token=token)
 
-    def __init__(self, session: Session = Depends(get_session)):
+    def __init__(
+            self,
+            session: Session = Depends(get_session),
+            settings: Settings = Depends(get_settings),
+    ):
         self.session = session
+        self.settings = settings
 
     def register_new_user(self, user_data: UserCreate) -> Token:
         with self.session.begin():
@@ -83,7 +91,7 @@ class AuthUserService:
             )
             self.session.add(user)
 
-        return self.create_token(user)
+        return self.create_token(user, self.settings)
 
     def authenticate_user(self, username: str, password: str) -> Token:
         exception = HTTPException(
@@ -104,4 +112,4 @@ class AuthUserService:
         if not self.verify_password(password, user.password_hash):
             raise exception
 
-        return self.create_token(user)
+        return self.create_token(user, self.settings)
@@ -1,10 +1,14 @@
 import logging
 
+from fastapi import Request
 from pythonjsonlogger import jsonlogger
 import redis
+from redis.backoff import NoBackoff
+from redis.retry import Retry
 from datetime import datetime, timedelta, timezone
 import json
 import os
+import time
 from typing import Dict, Any, Optional
 from sqlalchemy.orm.state import InstanceState
 from collections import deque
@@ -12,22 +16,63 @@ import threading
 
 
 class RedisCache:
-    def __init__(self, host='localhost', port=6379, db=0):
+    def __init__(self, host='localhost', port=6379, db=0,
+                 connect_timeout: float = 0.5, socket_timeout: float = 1.0,
+                 retry_backoff: float = 5.0):
         self._fallback_store = deque(maxlen=1000)
         self._lock = threading.Lock()
-        self.redis = None
-        try:
-            self.redis = redis.Redis(
-                host=host,
-                port=port,
-                db=db,
-                socket_connect_timeout=3,
-                socket_timeout=5,
-                retry_on_timeout=True
-            )
-            self.redis.ping()
-        except Exception as e:
-            logging.warning(f"Redis connection failed: {str(e)}. Using fallback storage.")
+        self._connect_lock = threading.Lock()
+        self.retry_backoff = retry_backoff
+        self._available = False
+        self._retry_at = 0.0
+        # Клиент не ходит в сеть до первой команды; без повторов, чтобы
+        # недоступный Redis стоил один короткий таймаут, а не серию
+        self._client = redis.Redis(
+            host=host,
+            port=port,
+            db=db,
+            socket_connect_timeout=connect_timeout,
+            socket_timeout=socket_timeout,
+            retry=Retry(NoBackoff(), 0),
+        )
+
+    @property
+    def redis(self) -> Optional[redis.Redis]:
+        """
+        Клиент Redis или None, пока он недоступен.
+
+        Подключение проверяется при первом обращении, после ошибки повторная
+        попытка делается не раньше чем через retry_backoff секунд.
+        """
+        if self._available:
+            return self._client
+        if time.monotonic() < self._retry_at:
+            return None
+
+        with self._connect_lock:
+            if self._available:
+                return self._client
+            if time.monotonic() < self._retry_at:
+                return None
+            try:
+                self._client.ping()
+                self._available = True
+                return self._client
+            except Exception as e:
+                self.mark_down(e)
+                return None
+
+    @property
+    def is_down(self) -> bool:
+        """
+        Redis недавно был недоступен: обращение к redis вернет None, не ходя в сеть.
+        """
+        return not self._available and time.monotonic() < self._retry_at
+
+    def mark_down(self, error: Exception):
+        self._available = False
+        self._retry_at = time.monotonic() + self.retry_backoff
+        logging.warning(f"Redis unavailable: {str(error)}. Using fallback storage.")
 
     def _serialize(self, data: Any) -> Any:
         if isinstance(data, (str, int, float, bool)) or data is None:
@@ -49,6 +94,8 @@ class RedisCache:
             if self.redis:
                 data = self.redis.get(key)
                 return json.loads(data) if data else None
+        except redis.RedisError as e:
+            self.mark_down(e)
         except Exception as e:
             logging.error(f"Redis get error: {str(e)}")
         return None
@@ -62,6 +109,9 @@ class RedisCache:
             with self._lock:
                 self._fallback_store.append((key, serialized))
             return False
+        except redis.RedisError as e:
+            self.mark_down(e)
+            return False
         except Exception as e:
             logging.error(f"Cache set error: {str(e)}")
             return False
@@ -70,6 +120,8 @@ class RedisCache:
         try:
             if self.redis:
                 self.redis.delete(*keys)
+        except redis.RedisError as e:
+            self.mark_down(e)
         except Exception as e:
             logging.error(f"Redis delete error: {str(e)}")
 
@@ -88,14 +140,18 @@ class RedisCache:
 
 
 class RequestLogger:
-    def __init__(self):
-        self.cache = RedisCache()
+    def __init__(self, cache: RedisCache):
+        self.cache = cache
         self._setup_logger()
 
     def _setup_logger(self):
         self.logger = logging.getLogger('todo_service')
         self.logger.setLevel(logging.INFO)
 
+        # Логгер общий для процесса: не дублируем обработчик при повторном старте приложения
+        if self.logger.handlers:
+            return
+
         os.makedirs('logs', exist_ok=True)
 
         file_handler = logging.FileHandler('logs/todo_service.log')
@@ -123,9 +179,15 @@ class RequestLogger:
             else:
                 with self.cache._lock:
                     self.cache._fallback_store.append(('todo_logs', log_entry))
+        except redis.RedisError as e:
+            self.cache.mark_down(e)
         except Exception as e:
             self.logger.error(f"Log storage failed: {str(e)}")
 
 
-logger = RequestLogger()
-cache = RedisCache()
+def get_cache(request: Request) -> RedisCache:
+    return request.app.state.cache
+
+
+def get_logger(request: Request) -> RequestLogger:
+    return request.app.state.logger
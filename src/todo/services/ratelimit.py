@@ -0,0 +1,188 @@
+import math
+import threading
+import time
+from typing import Dict, Tuple
+
+from fastapi import HTTPException, Request
+
+from ..settings import Settings
+from .auth import AuthUserService
+from .logging import RedisCache
+
+
+# Token bucket: атомарно пополняем и списываем токен на стороне Redis
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+
+redis.call('HMSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], ttl)
+return {allowed, tostring(tokens)}
+"""
+
+
+def get_client_key(request: Request, settings: Settings) -> str:
+    """
+    Ключ лимита: пользователь из токена, иначе IP клиента.
+    """
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        try:
+            user = AuthUserService.validate_token(token, settings)
+            return f"user:{user.id}"
+        except (HTTPException, ValueError):
+            pass
+
+    host = request.client.host if request.client else 'unknown'
+    return f"ip:{host}"
+
+
+class RateLimiter:
+    def __init__(self, cache: RedisCache, rate: float, burst: int, max_keys: int = 10000):
+        self.cache = cache
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._script = None
+        self.backend = 'memory'
+        self.allowed = 0
+        self.rejected = 0
+        self.redis_errors = 0
+
+    @property
+    def uses_network(self) -> bool:
+        """
+        Пойдет ли acquire в Redis. Если нет, его можно вызывать прямо в event loop.
+        """
+        return not self.cache.is_down
+
+    def _retry_after(self, tokens: float) -> int:
+        return max(1, math.ceil((1 - tokens) / self.rate))
+
+    def _acquire_redis(self, key: str, now: float) -> Tuple[bool, float]:
+        ttl = int(self.burst / self.rate * 1000) + 1000
+        allowed, tokens = self._script(
+            keys=[f"ratelimit:{key}"],
+            args=[self.rate, self.burst, now, ttl],
+        )
+        return bool(int(allowed)), float(tokens)
+
+    def _acquire_local(self, key: str, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + max(0.0, now - ts) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+
+        return allowed, tokens
+
+    def _prune(self, now: float):
+        # Корзины, которые успели заполниться полностью, ничем не отличаются от новых
+        idle = self.burst / self.rate
+        self._buckets = {
+            k: v for k, v in self._buckets.items() if now - v[1] < idle
+        }
+
+    def acquire(self, key: str) -> Tuple[bool, int]:
+        """
+        Списывает токен для ключа. Возвращает (разрешено, Retry-After в секундах).
+        """
+        now = time.time()
+        backend = 'redis'
+        result = None
+        client = self.cache.redis
+        if client:
+            try:
+                if self._script is None:
+                    self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+                result = self._acquire_redis(key, now)
+            except Exception as e:
+                with self._lock:
+                    self.redis_errors += 1
+                # Размыкаем цепь: следующие запросы retry_backoff секунд идут мимо Redis
+                self.cache.mark_down(e)
+        if result is None:
+            backend = 'memory'
+            result = self._acquire_local(key, now)
+
+        allowed, tokens = result
+        with self._lock:
+            # Отражаем хранилище, реально обработавшее последний запрос
+            self.backend = backend
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+
+        if allowed:
+            return True, 0
+        return False, self._retry_after(tokens)
+
+    def stats(self) -> dict:
+        return {
+            'backend': self.backend,
+            'rate': self.rate,
+            'burst': self.burst,
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'redis_errors': self.redis_errors,
+            'local_keys': len(self._buckets),
+        }
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.shed = 0
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.max_concurrent:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            'max_concurrent': self.max_concurrent,
+            'in_flight': self.in_flight,
+            'peak': self.peak,
+            'shed': self.shed,
+        }
+
+
+def get_rate_limiter(request: Request) -> RateLimiter:
+    return request.app.state.rate_limiter
+
+
+def get_concurrency_limiter(request: Request) -> ConcurrencyLimiter:
+    return request.app.state.concurrency_limiter
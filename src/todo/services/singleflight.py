@@ -0,0 +1,144 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request
+
+from .logging import RedisCache
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные промахи кэша по одному ключу в одну загрузку из БД.
+
+    Внутри процесса ожидающие запросы получают результат ведущего, между
+    воркерами загрузку сериализует короткая блокировка в Redis. Пока значение
+    пересчитывается, ожидающим отдается предыдущее значение (stale-while-revalidate).
+    """
+
+    def __init__(self, cache: RedisCache, ttl: int = 300, stale_ttl: int = 60,
+                 lock_timeout: float = 5.0, poll_interval: float = 0.05):
+        self.cache = cache
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._calls: Dict[str, _Call] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _stale_key(self, key: str) -> str:
+        return f"{key}:stale"
+
+    def _version(self, key: str) -> int:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def _get_stale(self, key: str) -> Optional[Any]:
+        if not self.stale_ttl:
+            return None
+        return self.cache.get(self._stale_key(key))
+
+    def _store(self, key: str, value: Any, version: int) -> bool:
+        """
+        Кладет значение в кэш, если ключ не сбрасывали с начала загрузки.
+        """
+        if self._version(key) != version:
+            return False
+        self.cache.set(key, value, ttl=self.ttl)
+        if self.stale_ttl:
+            self.cache.set(self._stale_key(key), value, ttl=self.ttl + self.stale_ttl)
+
+        # invalidate мог удалить ключи до нашей записи: версия к тому моменту уже увеличена
+        if self._version(key) != version:
+            self.cache.delete(key, self._stale_key(key))
+            return False
+        return True
+
+    def invalidate(self, *keys: str):
+        """
+        Сброс после записи: устаревшие копии тоже удаляются, иначе ожидающие
+        получили бы данные до изменения.
+
+        Загрузки, начатые до сброса, не кладут результат в кэш, а следующий
+        промах начинает новую загрузку. Версии локальны для процесса.
+        """
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._calls.pop(key, None)
+        self.cache.delete(*keys, *(self._stale_key(key) for key in keys))
+
+    def _load(self, key: str, loader: Callable[[], Any], version: int) -> Any:
+        lock = None
+        if self.cache.redis:
+            try:
+                lock = self.cache.redis.lock(f"lock:{key}", timeout=self.lock_timeout,
+                                             sleep=self.poll_interval)
+                if not lock.acquire(blocking=False):
+                    # Значение уже пересчитывает другой воркер
+                    stale = self._get_stale(key)
+                    if stale is not None and self._version(key) == version:
+                        return stale
+                    if not lock.acquire(blocking_timeout=self.lock_timeout):
+                        lock = None
+                    # Пока ждали, другой воркер мог положить значение в кэш
+                    value = self.cache.get(key)
+                    if value is not None and self._version(key) == version:
+                        return value
+            except Exception as e:
+                logging.error(f"Redis lock error: {str(e)}")
+                lock = None
+
+        try:
+            value = loader()
+            self._store(key, value, version)
+            return value
+        finally:
+            if lock is not None:
+                try:
+                    lock.release()
+                except Exception as e:
+                    logging.error(f"Redis unlock error: {str(e)}")
+
+    def do(self, key: str, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            version = self._versions.get(key, 0)
+
+        if not leader:
+            stale = self._get_stale(key)
+            if stale is not None:
+                return stale
+            if not call.event.wait(self.lock_timeout):
+                return self._load(key, loader, version)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._load(key, loader, version)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                # После invalidate под ключом может быть уже новая загрузка
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.event.set()
+
+
+def get_coalescer(request: Request) -> SingleFlight:
+    return request.app.state.coalescer
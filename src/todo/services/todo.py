@@ -5,12 +5,25 @@ from sqlalchemy.orm import Session
 from .. import tables
 from ..database import get_session
 from ..models.todos import TodoItem, ToDoCreate, ToDoUpdate
-from .logging import logger, cache
+from .logging import RedisCache, RequestLogger, get_cache, get_logger
+from .singleflight import SingleFlight, get_coalescer
+from .writebehind import WriteBehindBuffer, get_write_behind
 
 
 class ToDoService:
-    def __init__(self, session: Session = Depends(get_session)):
+    def __init__(
+        self,
+        session: Session = Depends(get_session),
+        cache: RedisCache = Depends(get_cache),
+        logger: RequestLogger = Depends(get_logger),
+        coalescer: SingleFlight = Depends(get_coalescer),
+        write_behind: WriteBehindBuffer = Depends(get_write_behind),
+    ):
         self.session = session
+        self.cache = cache
+        self.logger = logger
+        self.coalescer = coalescer
+        self.write_behind = write_behind
 
     def _get_user_todos_key(self, user_id: int) -> str:
         return f"user:{user_id}:todos"
@@ -19,7 +32,7 @@ class ToDoService:
         return f"user:{user_id}:todo:{todo_id}"
 
     def _clear_user_cache(self, user_id: int):
-        cache.delete(
+        self.coalescer.invalidate(
             self._get_user_todos_key(user_id),
             f"{self._get_user_todos_key(user_id)}:completed",
             f"{self._get_user_todos_key(user_id)}:active"
@@ -42,12 +55,13 @@ class ToDoService:
 
         try:
             # Пробуем получить из кэша
-            cached = cache.get(cache_key)
+            cached = self.cache.get(cache_key)
             if cached:
-                logger.log(action="cache_hit", resource="todo", user_id=user_id, todo_id=todo_id)
+                self.logger.log(action="cache_hit", resource="todo", user_id=user_id, todo_id=todo_id)
                 return tables.TodoItem(**cached)
 
             # Получаем из БД
+            pending = self.write_behind.get(user_id, todo_id)
             self._refresh_session()
             todo = (
                 self.session.query(tables.TodoItem)
@@ -56,26 +70,47 @@ class ToDoService:
             )
 
             if not todo:
-                logger.log(action="not_found", resource="todo", user_id=user_id, todo_id=todo_id)
+                self.logger.log(action="not_found", resource="todo", user_id=user_id, todo_id=todo_id)
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
             self.session.refresh(todo)
+            if pending is not None:
+                # Переключение еще не сброшено в БД
+                todo.is_completed = pending
 
             # Сохраняем в кэш
-            cache.set(cache_key, self._todo_to_dict(todo))
-            logger.log(action="get_success", resource="todo", user_id=user_id, todo_id=todo_id)
+            self.cache.set(cache_key, self._todo_to_dict(todo))
+            self.logger.log(action="get_success", resource="todo", user_id=user_id, todo_id=todo_id)
             return todo
 
         except Exception as e:
-            logger.log(action="get_error", resource="todo", user_id=user_id,
-                       todo_id=todo_id, error=str(e))
+            self.logger.log(action="get_error", resource="todo", user_id=user_id,
+                            todo_id=todo_id, error=str(e))
             raise
 
     def get_id(self, user_id: int, todo_id: int) -> tables.TodoItem:
-        logger.log(action="get_id_started", resource="todo",
-                   user_id=user_id, todo_id=todo_id)
+        self.logger.log(action="get_id_started", resource="todo",
+                        user_id=user_id, todo_id=todo_id)
         return self.get(user_id, todo_id)
 
+    def _load_list(self, user_id: int, is_completed: Optional[bool]) -> List[dict]:
+        pending = self.write_behind.get_user(user_id)
+        self._refresh_session()
+        query = self.session.query(tables.TodoItem).filter_by(user_id=user_id)
+        if is_completed is not None and not pending:
+            query = query.filter_by(is_completed=is_completed)
+
+        todos = [self._todo_to_dict(todo) for todo in query.all()]
+        if not pending:
+            return todos
+
+        # Накладываем несброшенные переключения и фильтруем уже по ним
+        for todo in todos:
+            todo['is_completed'] = pending.get(todo['id'], todo['is_completed'])
+        if is_completed is not None:
+            todos = [todo for todo in todos if todo['is_completed'] == is_completed]
+        return todos
+
     def get_list(self, user_id: int, is_completed: Optional[bool] = None) -> List[tables.TodoItem]:
         cache_key = self._get_user_todos_key(user_id)
         if is_completed is not None:
@@ -83,33 +118,25 @@ class ToDoService:
 
         try:
             # Пробуем получить из кэша
-            cached = cache.get(cache_key)
+            cached = self.cache.get(cache_key)
             if cached:
-                logger.log(action="cache_hit", resource="todos", user_id=user_id,
-                           is_completed=is_completed, count=len(cached))
+                self.logger.log(action="cache_hit", resource="todos", user_id=user_id,
+                                is_completed=is_completed, count=len(cached))
                 return [tables.TodoItem(**item) for item in cached]
 
-            # Получаем из БД
-            self._refresh_session()
-            query = self.session.query(tables.TodoItem).filter_by(user_id=user_id)
-            if is_completed is not None:
-                query = query.filter_by(is_completed=is_completed)
-
-            todos = query.all()
-            for todo in todos:
-                self.session.refresh(todo)
+            # Получаем из БД: одновременные промахи по ключу делят одну загрузку
+            todos_data = self.coalescer.do(
+                cache_key,
+                lambda: self._load_list(user_id, is_completed),
+            )
 
-            # Сохраняем в кэш
-            todos_data = [self._todo_to_dict(todo) for todo in todos]
-            cache.set(cache_key, todos_data)
-
-            logger.log(action="get_success", resource="todos", user_id=user_id,
-                       is_completed=is_completed, count=len(todos))
-            return todos
+            self.logger.log(action="get_success", resource="todos", user_id=user_id,
+                            is_completed=is_completed, count=len(todos_data))
+            return [tables.TodoItem(**item) for item in todos_data]
 
         except Exception as e:
-            logger.log(action="get_error", resource="todos", user_id=user_id,
-                       is_completed=is_completed, error=str(e))
+            self.logger.log(action="get_error", resource="todos", user_id=user_id,
+                            is_completed=is_completed, error=str(e))
             raise
 
     def create(self, user_id: int, todo_data: ToDoCreate) -> tables.TodoItem:
@@ -126,39 +153,82 @@ class ToDoService:
             # Очищаем кэш списков
             self._clear_user_cache(user_id)
 
-            logger.log(action="create_success", resource="todo",
-                       user_id=user_id, todo_id=todo.id)
+            self.logger.log(action="create_success", resource="todo",
+                            user_id=user_id, todo_id=todo.id)
             return todo
 
         except Exception as e:
             self.session.rollback()
-            logger.log(action="create_error", resource="todo",
-                       user_id=user_id, error=str(e))
+            self.logger.log(action="create_error", resource="todo",
+                            user_id=user_id, error=str(e))
             raise
 
+    def _is_toggle(self, todo: tables.TodoItem, changes: dict) -> bool:
+        return 'is_completed' in changes and all(
+            getattr(todo, field) == value
+            for field, value in changes.items()
+            if field != 'is_completed'
+        )
+
+    def _buffer_toggle(self, user_id: int, todo: tables.TodoItem, is_completed: bool) -> tables.TodoItem:
+        todo_dict = {**self._todo_to_dict(todo), 'is_completed': is_completed}
+        self.write_behind.submit(user_id, todo.id, is_completed)
+
+        # Кэш обновляем сразу, в БД значение попадет при следующем сбросе
+        self.cache.set(self._get_todo_key(user_id, todo.id), todo_dict)
+        self._clear_user_cache(user_id)
+
+        self.logger.log(action="update_buffered", resource="todo",
+                        user_id=user_id, todo_id=todo.id)
+        return tables.TodoItem(**todo_dict)
+
     def update(self, user_id: int, todo_id: int, todo_data: ToDoUpdate) -> tables.TodoItem:
+        pending = None
         try:
             self._refresh_session()
-            todo = self.get(user_id, todo_id)
+            # Объект из кэша не привязан к сессии, поэтому изменяемую задачу читаем из БД
+            todo = (
+                self.session.query(tables.TodoItem)
+                .filter_by(id=todo_id, user_id=user_id)
+                .first()
+            )
+
+            if not todo:
+                self.logger.log(action="not_found", resource="todo",
+                                user_id=user_id, todo_id=todo_id)
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+            changes = todo_data.model_dump(exclude_unset=True)
+
+            if self.write_behind.enabled and self._is_toggle(todo, changes):
+                return self._buffer_toggle(user_id, todo, changes['is_completed'])
+
+            # Прямая запись не должна быть перезаписана более старым переключением,
+            # а само переключение уходит в БД вместе с ней
+            pending = self.write_behind.discard(user_id, todo_id)
+            if pending is not None:
+                todo.is_completed = pending
 
-            for field, value in todo_data.model_dump(exclude_unset=True).items():
+            for field, value in changes.items():
                 setattr(todo, field, value)
 
             self.session.commit()
             self.session.refresh(todo)
 
             # Обновляем кэш
-            cache.set(self._get_todo_key(user_id, todo_id), self._todo_to_dict(todo))
+            self.cache.set(self._get_todo_key(user_id, todo_id), self._todo_to_dict(todo))
             self._clear_user_cache(user_id)
 
-            logger.log(action="update_success", resource="todo",
-                       user_id=user_id, todo_id=todo_id)
+            self.logger.log(action="update_success", resource="todo",
+                            user_id=user_id, todo_id=todo_id)
             return todo
 
         except Exception as e:
             self.session.rollback()
-            logger.log(action="update_error", resource="todo",
-                       user_id=user_id, todo_id=todo_id, error=str(e))
+            if pending is not None:
+                self.write_behind.submit(user_id, todo_id, pending)
+            self.logger.log(action="update_error", resource="todo",
+                            user_id=user_id, todo_id=todo_id, error=str(e))
             raise
 
     def delete(self, user_id: int, todo_id: int) -> None:
@@ -171,22 +241,23 @@ class ToDoService:
             )
 
             if not todo:
-                logger.log(action="not_found", resource="todo",
-                           user_id=user_id, todo_id=todo_id)
+                self.logger.log(action="not_found", resource="todo",
+                                user_id=user_id, todo_id=todo_id)
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
             self.session.delete(todo)
             self.session.commit()
+            self.write_behind.discard(user_id, todo_id)
 
             # Удаляем из кэша
-            cache.delete(self._get_todo_key(user_id, todo_id))
+            self.cache.delete(self._get_todo_key(user_id, todo_id))
             self._clear_user_cache(user_id)
 
-            logger.log(action="delete_success", resource="todo",
-                       user_id=user_id, todo_id=todo_id)
+            self.logger.log(action="delete_success", resource="todo",
+                            user_id=user_id, todo_id=todo_id)
 
         except Exception as e:
             self.session.rollback()
-            logger.log(action="delete_error", resource="todo",
-                       user_id=user_id, todo_id=todo_id, error=str(e))
+            self.logger.log(action="delete_error", resource="todo",
+                            user_id=user_id, todo_id=todo_id, error=str(e))
             raise
@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy.orm import sessionmaker
+
+from .. import tables
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+Key = Tuple[int, int]
+
+
+class WriteBehindBuffer:
+    """
+    Буфер переключений is_completed с отложенной пакетной записью в БД.
+
+    Каждое переключение сначала дописывается в журнал (с fsync), затем
+    попадает в память; фоновый поток периодически сбрасывает накопленные
+    значения одной транзакцией. При старте журнал воспроизводится.
+
+    Журнал и буфер принадлежат одному процессу: второй процесс с тем же
+    журналом не запустится, поэтому режим требует одного воркера.
+    """
+
+    def __init__(self, journal_path: str, session_maker: sessionmaker,
+                 interval: float = 1.0, enabled: bool = True):
+        self.session_maker = session_maker
+        self.enabled = enabled
+        self.interval = interval
+        self.journal_path = journal_path
+        self.segment_path = f"{journal_path}.flushing"
+        self._pending: Dict[Key, bool] = {}
+        # Значения сбрасываемого пакета видны читателям до коммита
+        self._inflight: Dict[Key, bool] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._journal = None
+        self._lock_file = None
+        self._thread = None
+        self.flushed = 0
+        self.batches = 0
+        self.errors = 0
+
+        if enabled:
+            self._acquire_journal_lock()
+            self._recover()
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _acquire_journal_lock(self):
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Блокировка снимается ОС при завершении процесса, в том числе аварийном
+        self._lock_file = open(f"{self.journal_path}.lock", 'a+')
+        try:
+            if fcntl:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise RuntimeError(
+                f"Write-behind journal {self.journal_path} is used by another process; "
+                f"WRITE_BEHIND_ENABLED requires a single worker"
+            ) from None
+
+    def _entry(self, key: Key, value: Optional[bool]) -> str:
+        return json.dumps({
+            'user_id': key[0],
+            'todo_id': key[1],
+            'is_completed': value,
+        }) + '\n'
+
+    def _append(self, key: Key, value: Optional[bool]):
+        self._journal.write(self._entry(key, value))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+    def _replay(self, path: str):
+        if not os.path.exists(path):
+            return
+
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Оборванная при падении последняя запись
+                    break
+                key = (entry['user_id'], entry['todo_id'])
+                if entry['is_completed'] is None:
+                    self._pending.pop(key, None)
+                else:
+                    self._pending[key] = entry['is_completed']
+
+    def _recover(self):
+        # Сегмент, который сбрасывался в момент падения, старше текущего журнала
+        self._replay(self.segment_path)
+        self._replay(self.journal_path)
+
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for key, value in self._pending.items():
+                f.write(self._entry(key, value))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        if os.path.exists(self.segment_path):
+            os.remove(self.segment_path)
+
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        if self._pending:
+            logging.warning(f"Recovered {len(self._pending)} buffered todo updates from journal")
+
+    def submit(self, user_id: int, todo_id: int, is_completed: bool):
+        key = (user_id, todo_id)
+        with self._lock:
+            self._append(key, is_completed)
+            self._pending[key] = is_completed
+
+    def discard(self, user_id: int, todo_id: int) -> Optional[bool]:
+        """
+        Убирает несброшенное значение.
+
+        Если ключ входит в сбрасываемый пакет, ждет коммита этого пакета (до
+        одной транзакции записи в БД), чтобы сброс не перезаписал последующее
+        прямое изменение. Остальные ключи сброс не затрагивает, их discard не ждет.
+        """
+        if not self.enabled:
+            return None
+
+        key = (user_id, todo_id)
+        with self._lock:
+            if key not in self._inflight:
+                return self._discard_pending(key)
+
+        with self._flush_lock, self._lock:
+            return self._discard_pending(key)
+
+    def _discard_pending(self, key: Key) -> Optional[bool]:
+        value = self._pending.pop(key, None)
+        if value is not None:
+            self._append(key, None)
+        return value
+
+    def get(self, user_id: int, todo_id: int) -> Optional[bool]:
+        key = (user_id, todo_id)
+        with self._lock:
+            value = self._pending.get(key)
+            return value if value is not None else self._inflight.get(key)
+
+    def get_user(self, user_id: int) -> Dict[int, bool]:
+        with self._lock:
+            return {
+                todo_id: value
+                for values in (self._inflight, self._pending)
+                for (owner_id, todo_id), value in values.items()
+                if owner_id == user_id
+            }
+
+    def _write(self, batch: Dict[Key, bool]):
+        ids_by_value: Dict[bool, list] = {True: [], False: []}
+        for (_, todo_id), value in batch.items():
+            ids_by_value[value].append(todo_id)
+
+        session = self.session_maker()
+        try:
+            for value, ids in ids_by_value.items():
+                if ids:
+                    (
+                        session.query(tables.TodoItem)
+                        .filter(tables.TodoItem.id.in_(ids))
+                        .update({'is_completed': value}, synchronize_session=False)
+                    )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch = self._inflight = self._pending
+                self._pending = {}
+                self._journal.close()
+                os.replace(self.journal_path, self.segment_path)
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+            try:
+                self._write(batch)
+                self.flushed += len(batch)
+                self.batches += 1
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Write-behind flush error: {str(e)}")
+                # Возвращаем в буфер то, что не было перезаписано новыми переключениями
+                with self._lock:
+                    for key, value in batch.items():
+                        if key not in self._pending:
+                            self._pending[key] = value
+                            self._append(key, value)
+            finally:
+                with self._lock:
+                    self._inflight = {}
+
+            os.remove(self.segment_path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Write-behind journal error: {str(e)}")
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+        self._journal.close()
+        self._lock_file.close()
+
+    def stats(self) -> dict:
+        return {
+            'enabled': self.enabled,
+            'interval': self.interval,
+            'pending': len(self._pending) + len(self._inflight),
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'errors': self.errors,
+        }
+
+
+def get_write_behind(request: Request) -> WriteBehindBuffer:
+    return request.app.state.write_behind
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings
 
 
@@ -11,10 +13,25 @@ class Settings(BaseSettings):
     jwt_expiration: int = 3600
 
     redis_url: str = 'redis://redis:6379/0'
+    cache_stale_ttl: int = 60
+    cache_lock_timeout: float = 5.0
+
+    # Только для одного воркера: журнал блокируется процессом
+    write_behind_enabled: bool = False
+    write_behind_interval: float = 1.0
+    write_behind_journal: str = 'logs/write_behind.journal'
+
+    rate_limit_enabled: bool = True
+    rate_limit_rate: float = 10.0
+    rate_limit_burst: int = 20
+    # Меньше лимита пула потоков AnyIO (40), в котором выполняются синхронные роуты
+    max_concurrent_requests: int = 32
 
     class Config:
         env_file = '.env'
         env_file_encoding = 'utf-8'
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
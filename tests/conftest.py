@@ -0,0 +1,84 @@
+import json
+import os
+import sys
+
+import pytest
+
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+
+from todo import tables  # noqa: E402
+from todo.app import app  # noqa: E402
+from todo.services.logging import RedisCache, get_cache  # noqa: E402
+from todo.settings import Settings, get_settings  # noqa: E402
+
+
+class MemoryCache(RedisCache):
+    """
+    Кэш в памяти с интерфейсом RedisCache для тестов без Redis.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.store = {}
+
+    @property
+    def redis(self):
+        return None
+
+    @property
+    def is_down(self):
+        return True
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ttl=300):
+        self.store[key] = json.loads(json.dumps(self._serialize(value)))
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.pop(key, None)
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings(
+        jwt_secret='test',
+        database_url=f"sqlite:///{tmp_path / 'database.sqlite3'}",
+        write_behind_journal=str(tmp_path / 'write_behind.journal'),
+        rate_limit_enabled=False,
+    )
+
+
+@pytest.fixture
+def memory_cache():
+    return MemoryCache()
+
+
+@pytest.fixture
+def client(settings, memory_cache, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tables.Base.metadata.create_all(create_engine(settings.database_url))
+
+    app.dependency_overrides[get_settings] = lambda: settings
+    app.dependency_overrides[get_cache] = lambda: memory_cache
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def auth_headers(client):
+    response = client.post('/auth/sign-up', json={
+        'email': 'user@example.com',
+        'username': 'user',
+        'password': 'password',
+    })
+    return {'Authorization': f"Bearer {response.json()['access_token']}"}
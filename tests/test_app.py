@@ -0,0 +1,80 @@
+import time
+
+from fastapi import Depends
+from fastapi.testclient import TestClient
+
+from todo.app import app
+from todo.services.logging import RedisCache, get_cache
+from todo.settings import Settings, get_settings
+
+from conftest import MemoryCache
+
+
+def test_settings_override_reaches_database_and_auth(client, settings, auth_headers):
+    response = client.post('/todos/', headers=auth_headers, json={
+        'title': 'Купить молоко',
+        'created_at': '2026-01-01T00:00:00',
+    })
+
+    assert response.status_code == 200
+    assert app.state.settings is settings
+    assert str(app.state.engine.url) == settings.database_url
+    assert client.get('/auth/user', headers=auth_headers).json()['username'] == 'user'
+
+
+def test_cache_override_reaches_dependent_resources(client, memory_cache):
+    assert app.state.cache is memory_cache
+    assert app.state.logger.cache is memory_cache
+    assert app.state.rate_limiter.cache is memory_cache
+    assert app.state.coalescer.cache is memory_cache
+
+
+def test_override_can_depend_on_other_resources(settings, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    seen = []
+
+    def cache_override(settings: Settings = Depends(get_settings)):
+        seen.append(settings)
+        return MemoryCache()
+
+    app.dependency_overrides[get_settings] = lambda: settings
+    app.dependency_overrides[get_cache] = cache_override
+    try:
+        with TestClient(app):
+            assert seen == [settings]
+    finally:
+        app.dependency_overrides.clear()
+
+
+class FlakyClient:
+    def __init__(self, failures):
+        self.failures = failures
+        self.pings = 0
+
+    def ping(self):
+        self.pings += 1
+        if self.pings <= self.failures:
+            raise ConnectionError('Connection refused')
+
+
+def test_redis_connects_lazily_and_retries_after_backoff():
+    cache = RedisCache(retry_backoff=0.05)
+    cache._client = FlakyClient(failures=1)
+
+    assert cache._client.pings == 0
+    assert cache.redis is None
+    assert cache.redis is None
+    assert cache._client.pings == 1
+
+    time.sleep(0.06)
+    assert cache.redis is cache._client
+    assert cache._client.pings == 2
+
+
+def test_redis_without_server_does_not_block():
+    cache = RedisCache(port=1)
+
+    start = time.monotonic()
+    assert cache.redis is None
+    assert cache.get('key') is None
+    assert time.monotonic() - start < 1
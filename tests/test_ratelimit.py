@@ -0,0 +1,155 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from todo.app import app
+from todo.services.logging import RedisCache, get_cache
+from todo.services.ratelimit import (
+    ConcurrencyLimiter,
+    RateLimiter,
+    get_concurrency_limiter,
+    get_rate_limiter,
+)
+from todo.settings import get_settings
+
+from conftest import MemoryCache
+
+
+@pytest.fixture
+def limiter():
+    return RateLimiter(MemoryCache(), rate=1, burst=3)
+
+
+def test_allows_burst_then_rejects(limiter):
+    results = [limiter._acquire_local('k', now=100.0)[0] for _ in range(4)]
+
+    assert results == [True, True, True, False]
+
+
+def test_refills_at_rate_up_to_burst(limiter):
+    for _ in range(3):
+        limiter._acquire_local('k', now=100.0)
+
+    assert limiter._acquire_local('k', now=102.0) == (True, 1.0)
+    assert limiter._acquire_local('k', now=102.0) == (True, 0.0)
+    assert limiter._acquire_local('k', now=102.0)[0] is False
+
+    allowed, tokens = limiter._acquire_local('k', now=1000.0)
+    assert allowed and tokens == 2.0
+
+
+def test_keys_have_separate_buckets(limiter):
+    for _ in range(3):
+        limiter._acquire_local('a', now=100.0)
+
+    assert limiter._acquire_local('a', now=100.0)[0] is False
+    assert limiter._acquire_local('b', now=100.0)[0] is True
+
+
+@pytest.mark.parametrize('rate, tokens, expected', [
+    (0.5, 0.0, 2),
+    (1, 0.5, 1),
+    (10, 0.0, 1),
+    (0.1, 0.25, 8),
+])
+def test_retry_after_is_time_to_next_token(rate, tokens, expected):
+    limiter = RateLimiter(MemoryCache(), rate=rate, burst=1)
+
+    assert limiter._retry_after(tokens) == expected
+
+
+def test_acquire_reports_retry_after_and_counters():
+    limiter = RateLimiter(MemoryCache(), rate=0.5, burst=1)
+
+    assert limiter.acquire('k') == (True, 0)
+    assert limiter.acquire('k') == (False, 2)
+
+    stats = limiter.stats()
+    assert stats['backend'] == 'memory'
+    assert (stats['allowed'], stats['rejected']) == (1, 1)
+
+
+def test_prune_drops_only_refilled_buckets():
+    limiter = RateLimiter(MemoryCache(), rate=1, burst=1, max_keys=2)
+    limiter._acquire_local('a', now=100.0)
+    limiter._acquire_local('b', now=100.5)
+
+    limiter._acquire_local('c', now=101.2)
+
+    assert set(limiter._buckets) == {'b', 'c'}
+
+
+class FailingRedis:
+    def __init__(self):
+        self.calls = 0
+
+    def ping(self):
+        return True
+
+    def register_script(self, script):
+        def run(**kwargs):
+            self.calls += 1
+            raise ConnectionError('Connection refused')
+        return run
+
+
+def test_redis_error_opens_circuit_for_backoff():
+    cache = RedisCache(retry_backoff=60)
+    cache._client = FailingRedis()
+    limiter = RateLimiter(cache, rate=1, burst=5)
+
+    assert limiter.acquire('k') == (True, 0)
+    assert limiter.acquire('k') == (True, 0)
+
+    assert cache._client.calls == 1
+    assert limiter.uses_network is False
+    assert limiter.stats()['backend'] == 'memory'
+    assert limiter.stats()['redis_errors'] == 1
+
+
+def test_concurrency_limiter_sheds_above_limit():
+    limiter = ConcurrencyLimiter(max_concurrent=2)
+
+    assert limiter.acquire() and limiter.acquire()
+    assert limiter.acquire() is False
+
+    limiter.release()
+    assert limiter.acquire() is True
+
+    assert limiter.stats() == {
+        'max_concurrent': 2,
+        'in_flight': 2,
+        'peak': 2,
+        'shed': 1,
+    }
+
+
+@pytest.fixture
+def limited_app(settings, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    settings.rate_limit_enabled = True
+    rate_limiter = RateLimiter(MemoryCache(), rate=0.5, burst=1)
+
+    app.dependency_overrides[get_settings] = lambda: settings
+    app.dependency_overrides[get_cache] = MemoryCache
+    app.dependency_overrides[get_rate_limiter] = lambda: rate_limiter
+    yield rate_limiter
+    app.dependency_overrides.clear()
+
+
+def test_middleware_answers_429_with_retry_after(limited_app):
+    with TestClient(app) as client:
+        assert client.get('/openapi.json').status_code == 200
+        response = client.get('/openapi.json')
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '2'
+
+
+def test_middleware_sheds_before_rate_limiting(limited_app):
+    app.dependency_overrides[get_concurrency_limiter] = lambda: ConcurrencyLimiter(0)
+
+    with TestClient(app) as client:
+        response = client.get('/openapi.json')
+
+    assert response.status_code == 503
+    assert limited_app.stats()['allowed'] == 0
@@ -0,0 +1,143 @@
+import threading
+
+import pytest
+
+from todo.services.singleflight import SingleFlight
+
+from conftest import MemoryCache
+
+
+class BlockingLoader:
+    """
+    Загрузчик, который ждет команды теста, чтобы запросы успели встретиться.
+    """
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        result = self.results.pop(0)
+        self.started.set()
+        assert self.release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def run_in_threads(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def run(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+@pytest.fixture
+def cache():
+    return MemoryCache()
+
+
+@pytest.fixture
+def coalescer(cache):
+    return SingleFlight(cache, stale_ttl=60, lock_timeout=5)
+
+
+def wait_for_followers(coalescer, key):
+    # Ведущий уже в загрузчике; даем остальным потокам дойти до ожидания
+    assert coalescer._calls[key].event.wait(0.1) is False
+
+
+def test_followers_share_one_load(coalescer, cache):
+    loader = BlockingLoader([['a']])
+    threads, results, errors = run_in_threads(5, lambda: coalescer.do('key', loader))
+    assert loader.started.wait(5)
+    wait_for_followers(coalescer, 'key')
+
+    loader.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == 1
+    assert results == [['a']] * 5
+    assert errors == [None] * 5
+    assert cache.get('key') == ['a']
+    assert cache.get('key:stale') == ['a']
+    assert coalescer._calls == {}
+
+
+def test_error_reaches_followers_and_is_not_cached(coalescer, cache):
+    loader = BlockingLoader([RuntimeError('database is locked'), ['a']])
+    threads, results, errors = run_in_threads(3, lambda: coalescer.do('key', loader))
+    assert loader.started.wait(5)
+    wait_for_followers(coalescer, 'key')
+
+    loader.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == 1
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert cache.get('key') is None
+
+    assert coalescer.do('key', loader) == ['a']
+
+
+def test_followers_get_stale_value_while_leader_loads(coalescer, cache):
+    cache.set('key:stale', ['old'])
+    loader = BlockingLoader([['new']])
+    leader, results, _ = run_in_threads(1, lambda: coalescer.do('key', loader))
+    assert loader.started.wait(5)
+
+    assert coalescer.do('key', loader) == ['old']
+
+    loader.release.set()
+    leader[0].join()
+    assert results == [['new']]
+    assert cache.get('key') == ['new']
+
+
+def test_invalidate_during_load_starts_new_load(coalescer, cache):
+    old = BlockingLoader([['before']])
+    leader, results, _ = run_in_threads(1, lambda: coalescer.do('key', old))
+    assert old.started.wait(5)
+
+    coalescer.invalidate('key')
+    assert coalescer.do('key', lambda: ['after']) == ['after']
+
+    old.release.set()
+    leader[0].join()
+
+    assert results == [['before']]
+    assert cache.get('key') == ['after']
+    assert cache.get('key:stale') == ['after']
+    assert coalescer._calls == {}
+
+
+def test_invalidate_between_check_and_store_removes_value(coalescer, cache):
+    version = coalescer._version('key')
+    original_set = cache.set
+
+    def set_then_invalidate(key, value, ttl=300):
+        original_set(key, value, ttl)
+        if key == 'key':
+            cache.set = original_set
+            with coalescer._lock:
+                coalescer._versions['key'] = version + 1
+
+    cache.set = set_then_invalidate
+
+    assert coalescer._store('key', ['before'], version) is False
+    assert cache.get('key') is None
+    assert cache.get('key:stale') is None
@@ -0,0 +1,310 @@
+import json
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from todo import tables
+from todo.app import app
+from todo.services.writebehind import WriteBehindBuffer
+
+
+def entry(user_id, todo_id, is_completed):
+    return json.dumps({
+        'user_id': user_id,
+        'todo_id': todo_id,
+        'is_completed': is_completed,
+    }) + '\n'
+
+
+class Recorder:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def __call__(self, batch):
+        self.batches.append(dict(batch))
+        if self.fail:
+            raise RuntimeError('database is locked')
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / 'write_behind.journal')
+
+
+@pytest.fixture
+def open_buffer(journal):
+    buffers = []
+
+    def factory(write=None):
+        buffer = WriteBehindBuffer(journal, session_maker=None, interval=3600)
+        buffer._write = write or Recorder()
+        buffers.append(buffer)
+        return buffer
+
+    yield factory
+    for buffer in buffers:
+        buffer.stop()
+
+
+def test_replays_flushing_segment_before_journal(journal, open_buffer):
+    with open(f"{journal}.flushing", 'w') as f:
+        f.write(entry(1, 1, True))
+        f.write(entry(1, 2, True))
+    with open(journal, 'w') as f:
+        f.write(entry(1, 1, False))
+
+    buffer = open_buffer()
+
+    assert buffer.get(1, 1) is False
+    assert buffer.get(1, 2) is True
+    assert buffer.get_user(1) == {1: False, 2: True}
+
+
+def test_ignores_torn_last_line(journal, open_buffer):
+    with open(journal, 'w') as f:
+        f.write(entry(1, 1, True))
+        f.write('{"user_id": 1, "todo_id": 2, "is_comp')
+
+    buffer = open_buffer()
+
+    assert buffer.get_user(1) == {1: True}
+
+
+def test_failed_write_is_requeued_and_journaled(open_buffer):
+    buffer = open_buffer(write=Recorder(fail=True))
+    buffer.submit(1, 1, True)
+
+    buffer.flush()
+
+    assert buffer.get(1, 1) is True
+    assert buffer.errors == 1
+
+    buffer.stop()
+    assert open_buffer().get(1, 1) is True
+
+
+def test_failed_write_keeps_newer_toggle(open_buffer):
+    def write(batch):
+        buffer.submit(1, 1, False)
+        raise RuntimeError('database is locked')
+
+    buffer = open_buffer(write=write)
+    buffer.submit(1, 1, True)
+
+    buffer.flush()
+
+    assert buffer.get(1, 1) is False
+    buffer.stop()
+    assert open_buffer().get(1, 1) is False
+
+
+def test_discard_beats_buffered_toggle(open_buffer):
+    recorder = Recorder()
+    buffer = open_buffer(write=recorder)
+    buffer.submit(1, 1, True)
+
+    assert buffer.discard(1, 1) is True
+    buffer.flush()
+
+    assert buffer.get(1, 1) is None
+    assert recorder.batches == []
+
+    buffer.stop()
+    assert open_buffer().get_user(1) == {}
+
+
+def test_flushing_values_stay_visible_until_commit(open_buffer):
+    seen = []
+
+    def write(batch):
+        seen.append((buffer.get(1, 1), buffer.get_user(1)))
+
+    buffer = open_buffer(write=write)
+    buffer.submit(1, 1, True)
+
+    buffer.flush()
+
+    assert seen == [(True, {1: True})]
+    assert buffer.get(1, 1) is None
+
+
+def test_second_process_cannot_open_journal(open_buffer):
+    open_buffer()
+
+    with pytest.raises(RuntimeError):
+        open_buffer()
+
+
+def test_discard_waits_only_for_keys_being_flushed(open_buffer):
+    started, release = threading.Event(), threading.Event()
+
+    def write(batch):
+        started.set()
+        assert release.wait(5)
+
+    buffer = open_buffer(write=write)
+    buffer.submit(1, 1, True)
+    flusher = threading.Thread(target=buffer.flush)
+    flusher.start()
+    assert started.wait(5)
+
+    buffer.submit(1, 2, True)
+    assert buffer.discard(1, 2) is True
+
+    discarder = threading.Thread(target=buffer.discard, args=(1, 1))
+    discarder.start()
+    discarder.join(0.1)
+    assert discarder.is_alive()
+
+    release.set()
+    flusher.join()
+    discarder.join()
+    assert buffer.get_user(1) == {}
+
+
+@pytest.fixture
+def session_maker(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'database.sqlite3'}")
+    tables.Base.metadata.create_all(engine)
+    session_maker = sessionmaker(bind=engine)
+
+    with session_maker() as session:
+        session.add(tables.User(id=1, email='user@example.com', username='user'))
+        session.add_all([
+            tables.TodoItem(id=todo_id, user_id=1, title=f"todo {todo_id}",
+                            is_completed=todo_id == 3, created_at=datetime(2026, 1, 1))
+            for todo_id in (1, 2, 3, 4)
+        ])
+        session.commit()
+
+    yield session_maker
+    engine.dispose()
+
+
+def completed(session_maker):
+    with session_maker() as session:
+        return {
+            todo.id: todo.is_completed
+            for todo in session.query(tables.TodoItem).order_by(tables.TodoItem.id)
+        }
+
+
+def test_flush_updates_database(journal, session_maker):
+    buffer = WriteBehindBuffer(journal, session_maker, interval=3600)
+    try:
+        buffer.submit(1, 1, True)
+        buffer.submit(1, 2, True)
+        buffer.submit(1, 3, False)
+
+        assert completed(session_maker) == {1: False, 2: False, 3: True, 4: False}
+        buffer.flush()
+
+        assert completed(session_maker) == {1: True, 2: True, 3: False, 4: False}
+        assert buffer.stats()['pending'] == 0
+        assert (buffer.flushed, buffer.batches) == (3, 1)
+    finally:
+        buffer.stop()
+
+
+@pytest.fixture
+def write_behind_client(settings, request):
+    # Фоновый сброс не запускается: тест сбрасывает буфер сам
+    settings.write_behind_enabled = True
+    settings.write_behind_interval = 3600
+    return request.getfixturevalue('client')
+
+
+@pytest.fixture
+def todos(write_behind_client, auth_headers):
+    ids = []
+    for title in ('first', 'second'):
+        response = write_behind_client.post('/todos/', headers=auth_headers, json={
+            'title': title,
+            'created_at': '2026-01-01T00:00:00',
+        })
+        ids.append(response.json()['id'])
+    return ids
+
+
+def db_completed(settings, todo_id):
+    engine = create_engine(settings.database_url)
+    try:
+        with sessionmaker(bind=engine)() as session:
+            return session.get(tables.TodoItem, todo_id).is_completed
+    finally:
+        engine.dispose()
+
+
+def test_toggle_is_buffered_until_flush(write_behind_client, auth_headers, todos, settings):
+    response = write_behind_client.put(f"/todos/{todos[0]}", headers=auth_headers,
+                                       json={'title': 'first', 'is_completed': True})
+
+    assert response.json()['is_completed'] is True
+    assert app.state.write_behind.get_user(1) == {todos[0]: True}
+    assert db_completed(settings, todos[0]) is False
+
+    app.state.write_behind.flush()
+    assert db_completed(settings, todos[0]) is True
+
+
+def test_reads_overlay_pending_toggles(write_behind_client, auth_headers, todos, memory_cache):
+    write_behind_client.put(f"/todos/{todos[0]}", headers=auth_headers,
+                            json={'title': 'first', 'is_completed': True})
+    memory_cache.store.clear()
+
+    def titles(**params):
+        response = write_behind_client.get('/todos/', headers=auth_headers, params=params)
+        return [todo['title'] for todo in response.json()]
+
+    todo = write_behind_client.get(f"/todos/{todos[0]}", headers=auth_headers).json()
+    assert todo['is_completed'] is True
+    assert titles() == ['first', 'second']
+    assert titles(is_completed=True) == ['first']
+    assert titles(is_completed=False) == ['second']
+
+
+def test_direct_update_discards_pending_toggle(write_behind_client, auth_headers, todos, settings):
+    write_behind_client.put(f"/todos/{todos[0]}", headers=auth_headers,
+                            json={'title': 'first', 'is_completed': True})
+
+    response = write_behind_client.put(f"/todos/{todos[0]}", headers=auth_headers,
+                                       json={'title': 'renamed'})
+
+    assert response.json()['title'] == 'renamed'
+    assert response.json()['is_completed'] is True
+    assert app.state.write_behind.get_user(1) == {}
+    assert db_completed(settings, todos[0]) is True
+
+
+def test_delete_discards_pending_toggle(write_behind_client, auth_headers, todos):
+    write_behind_client.put(f"/todos/{todos[0]}", headers=auth_headers,
+                            json={'title': 'first', 'is_completed': True})
+
+    response = write_behind_client.delete(f"/todos/{todos[0]}", headers=auth_headers)
+
+    assert response.status_code == 204
+    assert app.state.write_behind.get_user(1) == {}
+
+
+def test_failed_update_resubmits_pending_toggle(write_behind_client, auth_headers, todos,
+                                                settings, monkeypatch):
+    write_behind_client.put(f"/todos/{todos[0]}", headers=auth_headers,
+                            json={'title': 'first', 'is_completed': True})
+
+    def commit(self):
+        raise OperationalError('UPDATE todo_items', {}, Exception('database is locked'))
+
+    monkeypatch.setattr(Session, 'commit', commit)
+    with pytest.raises(OperationalError):
+        write_behind_client.put(f"/todos/{todos[0]}", headers=auth_headers,
+                                json={'title': 'renamed'})
+    monkeypatch.undo()
+
+    assert app.state.write_behind.get_user(1) == {todos[0]: True}
+    app.state.write_behind.flush()
+    assert db_completed(settings, todos[0]) is True